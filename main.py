@@ -3,12 +3,13 @@ from __future__ import annotations
 from pathlib import Path
 import os
 import argparse
+import asyncio
 
 from dotenv import load_dotenv
 
 from src.data_ingestion import load_directory
 from src.data_chunking import split_documents
-from src.data_embedding import EmbeddingManager
+from src.data_embedding import EmbeddingCache, EmbeddingManager
 from src.data_vector_store import VectorStore
 from src.rag_retriever import RAGRetriever
 from src.integrate_llm import OllamaChat
@@ -42,6 +43,8 @@ def main() -> None:
     DATA_DIR = BASE_DIR / os.getenv("DATA_DIR", "data")
     VECTOR_STORE_DIR = DATA_DIR / os.getenv("VECTOR_STORE_DIR", "vector_store")
     OLLAMA_DATA_DIR = DATA_DIR / os.getenv("OLLAMA_DATA_DIR", "ollama_data")
+    # Kept outside DATA_DIR so the exported tokenizer files (e.g. vocab.txt) are not ingested
+    ONNX_MODEL_DIR = BASE_DIR / os.getenv("ONNX_MODEL_DIR", "onnx_models")
     
 
     # -----------------------------
@@ -52,16 +55,38 @@ def main() -> None:
         docs_list: list[Document] = load_directory(DATA_DIR)
         doc_chunks: list[Document] = split_documents(docs_list)
 
-        embedding_manager = EmbeddingManager()
-        doc_chunk_texts = [doc.page_content for doc in doc_chunks]
-        embeddings = embedding_manager.generate_embeddings(doc_chunk_texts, verbose=True)
-
-        vector_store = VectorStore(persist_directory=VECTOR_STORE_DIR)
+        embedding_manager = EmbeddingManager(cache_dir=ONNX_MODEL_DIR)
+
+        # Only embed chunks that are not already in the embedding cache
+        embedding_cache = EmbeddingCache(VECTOR_STORE_DIR, embedding_manager.cache_key)
+        doc_ids = [VectorStore._generate_document_id(doc) for doc in doc_chunks]
+        missing = embedding_cache.missing(doc_ids)
+        print(f"{len(doc_ids) - len(missing)} chunks found in embedding cache, {len(missing)} to embed")
+        if missing:
+            new_embeddings = embedding_manager.generate_embeddings(
+                [doc_chunks[i].page_content for i in missing], verbose=True
+            )
+            embedding_cache.add([doc_ids[i] for i in missing], new_embeddings)
+        # Drop rows for chunks that no longer exist so the cache does not grow across runs
+        if embedding_cache.prune(doc_ids) or missing:
+            embedding_cache.save()
+        embeddings = embedding_cache.get(doc_ids)
+
+        # Recreate the collection if it was built with an older distance space, ID scheme
+        # or embedding model/backend, since unchanged IDs would otherwise keep old vectors
+        vector_store = VectorStore(
+            persist_directory=VECTOR_STORE_DIR,
+            embedding_key=embedding_manager.cache_key,
+            rebuild_stale=True,
+        )
         vector_store.add_documents(doc_chunks, embeddings)
     else:
         print("Loading existing vector store...")
-        vector_store = VectorStore(persist_directory=VECTOR_STORE_DIR)
-        embedding_manager = EmbeddingManager()  # needed for retriever
+        embedding_manager = EmbeddingManager(cache_dir=ONNX_MODEL_DIR)  # needed for retriever
+        vector_store = VectorStore(
+            persist_directory=VECTOR_STORE_DIR,
+            embedding_key=embedding_manager.cache_key,
+        )
 
     # -----------------------------
     # Initialize RAG retriever
@@ -77,6 +102,10 @@ def main() -> None:
     # -----------------------------
     # CLI Loop
     # -----------------------------
+    asyncio.run(run_chat_loop(ollama_chat))
+
+
+async def run_chat_loop(ollama_chat: OllamaChat) -> None:
     while True:
         query = input("You: ").strip()
         if query.lower() in {"exit", "end"}:
@@ -86,7 +115,7 @@ def main() -> None:
 
         print("Assistant: ", end="", flush=True)
         try:
-            for chunk in ollama_chat.chat(query, stream=True):
+            async for chunk in await ollama_chat.chat(query, stream=True):
                 print(chunk, end="", flush=True)
         except Exception as e:
             print(f"\n[Error] {e}")
@@ -1,10 +1,28 @@
 # src/data_chunking.py
 from __future__ import annotations
-from typing import List
+from typing import Dict, List, Tuple
 from langchain_core.documents import Document
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+# Splitters reused across calls, keyed by (chunk_size, chunk_overlap)
+_SPLITTER_CACHE: Dict[Tuple[int, int], RecursiveCharacterTextSplitter] = {}
+
+
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Return a cached RecursiveCharacterTextSplitter for the given settings."""
+    key = (chunk_size, chunk_overlap)
+    splitter = _SPLITTER_CACHE.get(key)
+    if splitter is None:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        )
+        _SPLITTER_CACHE[key] = splitter
+    return splitter
+
 
 def split_documents(
     documents: List[Document],
@@ -34,12 +52,7 @@ def split_documents(
             print("No documents provided to split.")
         return []
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
-    )
+    text_splitter = _get_splitter(chunk_size, chunk_overlap)
 
     doc_chunks: List[Document] = text_splitter.split_documents(documents)
 
@@ -1,46 +1,240 @@
 # src/data_embedding.py
 from __future__ import annotations
-from typing import List
+from pathlib import Path
+from typing import Any, List
+import os
+import shutil
 import numpy as np
 from sentence_transformers import SentenceTransformer
+from tqdm import tqdm
 
 
 class EmbeddingManager:
     """
     Handles embedding of text using a SentenceTransformer model.
 
+    When ONNX is enabled, the model is exported to ONNX Runtime and
+    dynamically quantized to int8 for faster CPU inference. Falls back to
+    the stock SentenceTransformer model if the export is unavailable.
+
     Attributes:
         model_name: Name of the SentenceTransformer model.
-        model: Loaded SentenceTransformer model instance.
+        model: Loaded SentenceTransformer model instance (PyTorch path).
+        onnx: Whether the ONNX Runtime path is in use.
+        cache_dir: Directory where the quantized ONNX model is cached.
     """
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2") -> None:
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        onnx: bool = True,
+        cache_dir: str | Path = "../onnx_models",
+        max_seq_length: int = 256,
+    ) -> None:
         """
         Initialize the EmbeddingManager and load the model.
 
         Args:
             model_name: Hugging Face / SentenceTransformers model name.
+            onnx: If True, run the model through ONNX Runtime with int8
+                  dynamic quantization.
+            cache_dir: Directory used to cache the exported ONNX model. Keep it
+                       outside the ingestion directory, since the export
+                       includes tokenizer .txt files.
+            max_seq_length: Maximum number of tokens per text (ONNX path).
         """
         self.model_name: str = model_name
+        self.onnx: bool = onnx
+        self.cache_dir: Path = Path(cache_dir)
+        self.max_seq_length: int = max_seq_length
+
         self.model: SentenceTransformer | None = None
+        self.tokenizer: Any = None
+        self.session: Any = None
+        self._input_names: set[str] = set()
+
         self._load_model()
 
+    @property
+    def cache_key(self) -> str:
+        """Identifies the model and backend that produce this manager's embeddings."""
+        backend = "onnx-int8" if self.onnx else "torch"
+        return f"{self.model_name}:{backend}"
+
     def _load_model(self) -> None:
-        """Load the SentenceTransformer model."""
+        """Load the ONNX Runtime session or the SentenceTransformer model."""
+        if self.onnx:
+            try:
+                self._load_onnx_model()
+                return
+            except Exception as e:
+                print(f"ONNX Runtime unavailable ({e}), falling back to SentenceTransformer.")
+                self.onnx = False
+                self.tokenizer = None
+                self.session = None
+
         try:
+            self._configure_torch_threads()
             self.model = SentenceTransformer(self.model_name)
+            self._cast_model_precision()
             # print(f"{self.model_name} embedding dimensions: {self.model.get_sentence_embedding_dimension()}")
         except Exception as e:
             print(f"Error loading embedding model '{self.model_name}': {e}")
             raise
 
-    def generate_embeddings(self, texts: List[str], verbose: bool = False) -> np.ndarray:
+    @staticmethod
+    def _configure_torch_threads() -> None:
+        """Use all CPU cores for intra-op parallelism instead of PyTorch's default."""
+        import torch
+
+        torch.set_num_threads(os.cpu_count() or 4)
+        try:
+            torch.set_num_interop_threads(2)
+        except RuntimeError:
+            # Can only be set once, before any inter-op work has started
+            pass
+
+    @staticmethod
+    def _cpu_supports_bf16() -> bool:
+        """Return True if the CPU advertises native bfloat16 support (AVX512-BF16 / AMX)."""
+        try:
+            with open("/proc/cpuinfo", encoding="utf-8") as f:
+                flags = f.read()
+        except OSError:
+            return False
+        return "avx512_bf16" in flags or "amx_bf16" in flags
+
+    def _cast_model_precision(self) -> None:
+        """
+        Cast the model to float16 on GPU, or bfloat16 on CPUs with native bf16.
+
+        Keeps float32 otherwise, since float16 MiniLM on plain CPUs loses too
+        much precision and has no fast kernels.
+        """
+        import torch
+
+        if self.model.device.type == "cuda":
+            dtype = torch.float16
+        elif self._cpu_supports_bf16():
+            dtype = torch.bfloat16
+        else:
+            return
+
+        try:
+            self.model = self.model.to(dtype=dtype)
+        except Exception as e:
+            print(f"Could not cast embedding model to {dtype} ({e}), keeping float32.")
+            self.model = self.model.to(dtype=torch.float32)
+
+    def _load_onnx_model(self) -> None:
+        """
+        Export the model to ONNX, quantize it to int8 and open an inference session.
+
+        The quantized model is cached under `cache_dir` so that only the first
+        run pays the export cost. A failed export is removed so the next start
+        does not reuse a half-written model.
+
+        Raises:
+            ImportError: If optimum / onnxruntime are not installed.
+            Exception: If the export or session creation fails.
+        """
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        hub_id = self.model_name if "/" in self.model_name else f"sentence-transformers/{self.model_name}"
+        model_dir = self.cache_dir / hub_id.replace("/", "__")
+        quantized_dir = model_dir / "quantized"
+        onnx_path = quantized_dir / "model_quantized.onnx"
+        exporting = not onnx_path.exists()
+
+        try:
+            if exporting:
+                print(f"Exporting '{hub_id}' to ONNX (int8), cached at {quantized_dir}...")
+                ort_model = ORTModelForFeatureExtraction.from_pretrained(hub_id, export=True)
+                ort_model.save_pretrained(model_dir)
+                AutoTokenizer.from_pretrained(hub_id).save_pretrained(quantized_dir)
+
+                quantizer = ORTQuantizer.from_pretrained(ort_model)
+                quantizer.quantize(
+                    save_dir=quantized_dir,
+                    quantization_config=AutoQuantizationConfig.avx512_vnni(
+                        is_static=False, per_channel=False
+                    ),
+                )
+
+            self.tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = os.cpu_count() or 4
+            session_options.inter_op_num_threads = 2
+            self.session = onnxruntime.InferenceSession(
+                str(onnx_path),
+                sess_options=session_options,
+                providers=["CPUExecutionProvider"],
+            )
+            self._input_names = {node.name for node in self.session.get_inputs()}
+        except Exception as e:
+            print(f"Error loading ONNX embedding model '{hub_id}': {e}")
+            if exporting:
+                shutil.rmtree(model_dir, ignore_errors=True)
+            raise
+
+    def _encode_onnx(self, texts: List[str], batch_size: int, verbose: bool) -> np.ndarray:
+        """
+        Encode texts with the ONNX session: mean-pool token states and L2-normalize.
+
+        Args:
+            texts: List of strings to embed, ideally sorted by length.
+            batch_size: Number of texts encoded per session run.
+            verbose: If True, display a progress bar.
+
+        Returns:
+            Numpy array of shape (len(texts), embedding_dim).
+        """
+        batches = range(0, len(texts), batch_size)
+        outputs: list[np.ndarray] = []
+
+        for start in tqdm(batches, desc="Batches", disable=not verbose):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds = {
+                name: array.astype(np.int64)
+                for name, array in encoded.items()
+                if name in self._input_names
+            }
+            token_states: np.ndarray = self.session.run(None, feeds)[0]
+
+            mask = encoded["attention_mask"][..., np.newaxis].astype(np.float32)
+            pooled = (token_states * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            outputs.append(pooled / np.clip(norms, 1e-12, None))
+
+        return np.concatenate(outputs).astype(np.float32, copy=False)
+
+    def generate_embeddings(
+        self,
+        texts: List[str],
+        verbose: bool = False,
+        batch_size: int = 64,
+    ) -> np.ndarray:
         """
         Generate embeddings for a list of texts.
 
+        Texts are sorted by length before encoding so that each mini-batch
+        holds similarly sized inputs and little compute is spent on padding
+        tokens. Embeddings are returned in the original input order.
+
         Args:
             texts: List of strings to embed.
             verbose: If True, display a progress bar during embedding.
+            batch_size: Number of texts encoded per forward pass.
 
         Returns:
             Numpy array of shape (len(texts), embedding_dim) containing embeddings.
@@ -49,13 +243,189 @@ class EmbeddingManager:
             return np.array([])
 
         try:
+            order = np.argsort([len(text) for text in texts], kind="stable")
+            sorted_texts = [texts[i] for i in order]
+
             embeddings: np.ndarray
-            if verbose:
-                embeddings = self.model.encode(texts, show_progress_bar=True)
+            if self.onnx:
+                embeddings = self._encode_onnx(sorted_texts, batch_size, verbose)
             else:
-                embeddings = self.model.encode(texts)
+                embeddings = self.model.encode(
+                    sorted_texts,
+                    batch_size=batch_size,
+                    show_progress_bar=verbose,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                )
+                # Half-precision models return float16 rows; keep float32 downstream
+                embeddings = np.asarray(embeddings, dtype=np.float32)
             # print(f"Generated embeddings with shape: {embeddings.shape}")
-            return embeddings
+
+            # Scatter back to the caller's order
+            inverse = np.empty_like(order)
+            inverse[order] = np.arange(len(order))
+            return embeddings[inverse]
         except Exception as e:
             print(f"Error generating embeddings: {e}")
             raise
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of chunk embeddings keyed by document ID.
+
+    Stored as a single `embeddings.npz` in the cache directory, holding the
+    rows, their document IDs and the model key, so a reindex only embeds
+    chunks whose content changed.
+    Rows are kept as float16 to halve memory and disk usage, and are
+    returned as float32.
+
+    Attributes:
+        cache_dir: Directory holding the cache files.
+        model_key: Model and backend the cached rows were produced with
+                   (see EmbeddingManager.cache_key).
+    """
+
+    def __init__(self, cache_dir: str | Path, model_key: str) -> None:
+        """
+        Initialize the cache and load any existing entries.
+
+        Args:
+            cache_dir: Directory holding the cache files.
+            model_key: Model and backend identifier; a cache built with a
+                       different model or backend is discarded.
+        """
+        self.cache_dir: Path = Path(cache_dir)
+        self.model_key: str = model_key
+
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._embeddings: np.ndarray = np.empty((0, 0), dtype=np.float16)
+
+        self._load()
+
+    @property
+    def _embeddings_path(self) -> Path:
+        return self.cache_dir / "embeddings.npz"
+
+    def _load(self) -> None:
+        """Load cached embeddings, ignoring missing, stale or inconsistent files."""
+        if not self._embeddings_path.exists():
+            return
+
+        try:
+            with np.load(self._embeddings_path, allow_pickle=False) as data:
+                model_key = str(data["model_key"])
+                ids: list[str] = data["ids"].tolist()
+                embeddings = data["embeddings"]
+        except Exception as e:
+            print(f"Ignoring unreadable embedding cache: {e}")
+            return
+
+        if model_key != self.model_key or len(ids) != len(embeddings):
+            return
+
+        self._ids = ids
+        self._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+        self._embeddings = embeddings.astype(np.float16, copy=False)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def missing(self, ids: List[str]) -> list[int]:
+        """
+        Return the positions of IDs that are not cached, one per distinct ID.
+
+        Args:
+            ids: Document IDs to look up.
+
+        Returns:
+            Indices into `ids` that need to be embedded.
+        """
+        seen: set[str] = set()
+        positions: list[int] = []
+        for i, doc_id in enumerate(ids):
+            if doc_id in self._rows or doc_id in seen:
+                continue
+            seen.add(doc_id)
+            positions.append(i)
+        return positions
+
+    def add(self, ids: List[str], embeddings: np.ndarray) -> None:
+        """
+        Add new embeddings to the cache (in memory; call `save` to persist).
+
+        Args:
+            ids: Document IDs, one per embedding row.
+            embeddings: NumPy array of shape (len(ids), embedding_dim).
+
+        Raises:
+            ValueError: If ID and embedding counts do not match.
+        """
+        if len(ids) != len(embeddings):
+            raise ValueError("Number of ids must match number of embeddings")
+        if not ids:
+            return
+
+        embeddings = np.asarray(embeddings, dtype=np.float16)
+        first_row = len(self._ids)
+        self._embeddings = embeddings if first_row == 0 else np.vstack([self._embeddings, embeddings])
+        for offset, doc_id in enumerate(ids):
+            self._rows[doc_id] = first_row + offset
+        self._ids.extend(ids)
+
+    def get(self, ids: List[str]) -> np.ndarray:
+        """
+        Return cached embeddings for the given IDs, in order.
+
+        Args:
+            ids: Document IDs, all of which must be cached.
+
+        Returns:
+            float32 NumPy array of shape (len(ids), embedding_dim).
+
+        Raises:
+            KeyError: If an ID is not cached.
+        """
+        rows = [self._rows[doc_id] for doc_id in ids]
+        return self._embeddings[rows].astype(np.float32)
+
+    def prune(self, ids: List[str]) -> int:
+        """
+        Drop every cached row whose ID is not in `ids`.
+
+        Args:
+            ids: Document IDs to keep.
+
+        Returns:
+            Number of rows removed.
+        """
+        keep = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in self._rows]
+        removed = len(self._ids) - len(keep)
+        if removed == 0:
+            return 0
+
+        self._embeddings = self._embeddings[[self._rows[doc_id] for doc_id in keep]]
+        self._ids = keep
+        self._rows = {doc_id: row for row, doc_id in enumerate(keep)}
+        return removed
+
+    def save(self) -> None:
+        """
+        Atomically write the cache to disk.
+
+        Rows, IDs and model key live in one file, written to a temp file and
+        renamed, so a crash can never pair new rows with old IDs.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        tmp_path = self._embeddings_path.with_name(self._embeddings_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                embeddings=self._embeddings,
+                ids=np.array(self._ids, dtype=str),
+                model_key=np.array(self.model_key),
+            )
+
+        os.replace(tmp_path, self._embeddings_path)
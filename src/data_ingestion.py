@@ -1,9 +1,16 @@
 # src/data_ingestion.py
 from langchain_core.documents import Document
-from langchain_community.document_loaders import TextLoader, DirectoryLoader, PyMuPDFLoader
+from langchain_community.document_loaders import TextLoader
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from typing import List, Optional
 import os
 
+import pymupdf
+
+# Same page separator PyMuPDFLoader uses in "single" mode
+PDF_PAGES_DELIMITER = "\n\f"
+
 
 def load_text_file(path: str, verbose: bool = True) -> List[Document]:
     """
@@ -25,15 +32,83 @@ def load_text_file(path: str, verbose: bool = True) -> List[Document]:
     return documents
 
 
-def load_directory(dir_path: str, file_types: Optional[List[str]] = None, verbose: bool = True) -> List[Document]:
+def load_pdf_file(path: str) -> List[Document]:
+    """
+    Load a PDF file into a single Document with all pages combined.
+
+    The file is read into memory in one call and pages are decoded from the
+    in-memory buffer, instead of going through PyMuPDFLoader.
+
+    Args:
+        path: Path to the PDF file.
+
+    Returns:
+        List containing one Document object, with 'file_type' and 'filename'
+        metadata already set.
+    """
+    with pymupdf.open(stream=Path(path).read_bytes(), filetype="pdf") as pdf:
+        text = PDF_PAGES_DELIMITER.join(page.get_text("text") for page in pdf)
+        metadata = {key: value for key, value in (pdf.metadata or {}).items() if value}
+        metadata.update(
+            source=str(path),
+            file_path=str(path),
+            total_pages=pdf.page_count,
+            file_type='pdf',
+            filename=os.path.basename(path),
+        )
+
+    return [Document(page_content=text, metadata=metadata)]
+
+
+def _load_one(path: Path) -> List[Document]:
+    """
+    Load a single .txt or .pdf file. Runs inside a worker process.
+
+    Documents are built with their final metadata ('source', 'file_type',
+    'filename'), so no second pass over the loaded documents is needed.
+    A file that fails to load is reported and skipped, so it does not
+    abort the rest of the directory.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        List of Document objects loaded from the file (empty on failure).
+    """
+    try:
+        if path.suffix == '.pdf':
+            return load_pdf_file(str(path))
+
+        metadata = {
+            'source': str(path),
+            'file_type': path.suffix.lstrip('.'),
+            'filename': path.name,
+        }
+        return [Document(page_content=path.read_text(encoding="utf-8"), metadata=metadata)]
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+        return []
+
+
+def load_directory(
+    dir_path: str,
+    file_types: Optional[List[str]] = None,
+    verbose: bool = True,
+    max_workers: Optional[int] = None,
+) -> List[Document]:
     """
     Load all documents of specified types from a directory.
 
+    Files are parsed in parallel with a process pool, since parsing is
+    CPU-bound and independent across files.
+
     Args:
         dir_path: Path to the directory to scan.
         file_types: List of file types to load (e.g., ['txt', 'pdf']).
                     Defaults to ['txt', 'pdf'].
         verbose: If True, prints debug information.
+        max_workers: Number of worker processes. Defaults to os.cpu_count(),
+                     capped at the number of files.
 
     Returns:
         List of Document objects with metadata including 'file_type' and 'filename'.
@@ -44,38 +119,28 @@ def load_directory(dir_path: str, file_types: Optional[List[str]] = None, verbos
     all_docs: List[Document] = []
 
     try:
-        # Load text files
-        if 'txt' in file_types:
-            text_loader = DirectoryLoader(
-                dir_path,
-                glob="**/*.txt",
-                loader_cls=TextLoader,
-                loader_kwargs={'encoding': 'utf-8'},
-            )
-            text_docs = text_loader.load()
-            for doc in text_docs:
-                doc.metadata['file_type'] = 'txt'
-                doc.metadata['filename'] = os.path.basename(doc.metadata.get('source', 'unknown'))
-            all_docs.extend(text_docs)
-            if verbose:
-                print(f"{len(text_docs)} text documents loaded from {dir_path}")
-
-        # Load PDF files
-        if 'pdf' in file_types:
-            pdf_loader = DirectoryLoader(
-                dir_path,
-                glob="**/*.pdf",
-                loader_cls=lambda path: PyMuPDFLoader(path, mode="single"),  # combine pages
-            )
-            pdf_docs = pdf_loader.load()
-            for doc in pdf_docs:
-                doc.metadata['file_type'] = 'pdf'
-                doc.metadata['filename'] = os.path.basename(doc.metadata.get('source', 'unknown'))
-            all_docs.extend(pdf_docs)
-            if verbose:
-                print(f"{len(pdf_docs)} PDF documents loaded from {dir_path}")
+        paths: List[Path] = []
+        for file_type in file_types:
+            paths.extend(sorted(Path(dir_path).rglob(f"*.{file_type}")))
+
+        if paths:
+            workers = min(max_workers or os.cpu_count() or 1, len(paths))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # One file per task, so every worker gets work on small corpora
+                results = list(executor.map(_load_one, paths, chunksize=1))
+        else:
+            results = []
+
+        counts = {file_type: 0 for file_type in file_types}
+        for path, docs in zip(paths, results):
+            counts[path.suffix.lstrip('.')] += len(docs)
+            all_docs.extend(docs)
 
         if verbose:
+            if 'txt' in counts:
+                print(f"{counts['txt']} text documents loaded from {dir_path}")
+            if 'pdf' in counts:
+                print(f"{counts['pdf']} PDF documents loaded from {dir_path}")
             print(f"Total documents loaded: {len(all_docs)}\n")
 
     except Exception as e:
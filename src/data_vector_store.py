@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import hashlib
+import json
 import os
 from collections.abc import Iterable
 from typing import Protocol, TypedDict
@@ -8,6 +9,20 @@ from typing import Protocol, TypedDict
 import chromadb
 import numpy as np
 
+# Number of records sent to Chroma per `collection.add` call
+SHARD_SIZE = 1024
+
+# HNSW index settings; embeddings are L2-normalized so cosine is exact
+HNSW_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+# Bump when `_generate_document_id` changes so stale collections get rebuilt
+ID_SCHEME_VERSION = 2
+
 class VectorStore:
     """
     Persistent vector store wrapper for RAG document embeddings.
@@ -20,6 +35,8 @@ class VectorStore:
         self,
         collection_name: str = "documents",
         persist_directory: str = "../data/vector_store",
+        embedding_key: str | None = None,
+        rebuild_stale: bool = False,
     ) -> None:
         """
         Initialize the vector store.
@@ -27,19 +44,36 @@ class VectorStore:
         Args:
             collection_name: Name of the ChromaDB collection.
             persist_directory: Filesystem path for persistent storage.
+            embedding_key: Model and backend of the embeddings (see
+                           `EmbeddingManager.cache_key`); not checked if None.
+            rebuild_stale: If True, drop and recreate an existing collection
+                           whose distance space, ID scheme or embedding
+                           model is outdated.
         """
         self.collection_name: str = collection_name
         self.persist_directory: str = persist_directory
+        self.embedding_key: str | None = embedding_key
+        self.rebuild_stale: bool = rebuild_stale
 
         self.client: chromadb.ClientAPI
         self.collection: chromadb.Collection
 
         self._initialize_store()
 
+        # IDs already stored, as 64-bit digests, for dedup without Chroma round-trips
+        self._ids_path: str = os.path.join(
+            self.persist_directory, "stored_ids.bin"
+        )
+        self._ids: set[int] = self._load_stored_ids()
+
     def _initialize_store(self) -> None:
         """
         Create or load the persistent ChromaDB collection.
 
+        An existing collection built with another distance space, ID scheme
+        or embedding model is recreated when `rebuild_stale` is set;
+        otherwise a warning is printed.
+
         Raises:
             RuntimeError: If initialization fails.
         """
@@ -50,11 +84,36 @@ class VectorStore:
                 path=self.persist_directory
             )
 
+            metadata = {
+                "description": "Document embeddings for RAG",
+                "id_scheme": ID_SCHEME_VERSION,
+                **HNSW_METADATA,
+            }
+            if self.embedding_key is not None:
+                metadata["embedding_model"] = self.embedding_key
+
             self.collection = self.client.get_or_create_collection(
                 name=self.collection_name,
-                metadata={"description": "Document embeddings for RAG"},
+                metadata=metadata,
             )
 
+            stale = self._stale_reasons(self.collection.metadata or {}, metadata)
+            if stale and self.rebuild_stale:
+                print(
+                    f"Rebuilding collection {self.collection_name} "
+                    f"({', '.join(stale)})"
+                )
+                self.client.delete_collection(self.collection_name)
+                self.collection = self.client.create_collection(
+                    name=self.collection_name,
+                    metadata=metadata,
+                )
+            elif stale:
+                print(
+                    f"[Warning] Collection is outdated ({', '.join(stale)}); "
+                    "run with --reindex to rebuild it."
+                )
+
             print(f"Vector store initialized. Collection: {self.collection_name}")
             print(
                 f"Number of documents in collection: "
@@ -100,16 +159,14 @@ class VectorStore:
         ids: list[str] = []
         metadatas: list[StoredMetadata] = []
         documents_text: list[str] = []
-        embeddings_list: list[list[float]] = []
-
-        existing_ids = self._get_existing_ids()
+        keep_rows: list[int] = []
+        new_keys: set[int] = set()
 
-        for index, (doc, embedding) in enumerate(
-            zip(documents_list, embeddings)
-        ):
+        for index, doc in enumerate(documents_list):
             doc_id = self._generate_document_id(doc)
+            key = self._id_to_key(doc_id)
 
-            if doc_id in existing_ids:
+            if key in self._ids or key in new_keys:
                 continue
 
             ids.append(doc_id)
@@ -120,22 +177,32 @@ class VectorStore:
                 }
             )
             documents_text.append(doc.page_content)
-            embeddings_list.append(embedding.tolist())
+            keep_rows.append(index)
 
-            existing_ids.add(doc_id)
+            new_keys.add(key)
 
         if not ids:
             print("No new documents to add. All documents already exist.")
             print()
             return
 
+        # Passed to Chroma as one contiguous float32 array, no per-row lists
+        new_embeddings = np.ascontiguousarray(
+            self._normalize(embeddings[keep_rows]), dtype=np.float32
+        )
+
         try:
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings_list,
-                metadatas=metadatas,
-                documents=documents_text,
-            )
+            for start in range(0, len(ids), SHARD_SIZE):
+                end = start + SHARD_SIZE
+                self.collection.add(
+                    ids=ids[start:end],
+                    embeddings=new_embeddings[start:end],
+                    metadatas=metadatas[start:end],
+                    documents=documents_text[start:end],
+                )
+
+            self._ids.update(new_keys)
+            self._save_stored_ids()
 
             print(f"Successfully added {len(ids)} new documents")
             print(
@@ -148,27 +215,85 @@ class VectorStore:
                 "Failed to add documents to vector store"
             ) from exc
 
-    def _get_existing_ids(self) -> set[str]:
+    def _load_stored_ids(self) -> set[int]:
         """
-        Retrieve existing document IDs from the collection.
+        Load the set of stored document IDs from `stored_ids.bin`.
+
+        The file is rebuilt from the collection if it is missing or out of
+        sync with the collection's document count.
         """
+        if os.path.exists(self._ids_path):
+            keys = set(np.fromfile(self._ids_path, dtype="<u8").tolist())
+            if len(keys) == self.collection.count():
+                return keys
+
         try:
-            result = self.collection.get()
-            return set(result["ids"])
+            result = self.collection.get(include=[])
+            keys = {self._id_to_key(doc_id) for doc_id in result["ids"]}
         except Exception:
             return set()
 
+        self._ids = keys
+        self._save_stored_ids()
+        return keys
+
+    def _save_stored_ids(self) -> None:
+        """Atomically write the stored ID set to `stored_ids.bin`."""
+        tmp_path = f"{self._ids_path}.tmp"
+        np.array(sorted(self._ids), dtype="<u8").tofile(tmp_path)
+        os.replace(tmp_path, self._ids_path)
+
+    @staticmethod
+    def _stale_reasons(
+        current: dict[str, object],
+        expected: dict[str, object],
+    ) -> list[str]:
+        """List the collection settings that differ from the expected ones."""
+        reasons: list[str] = []
+
+        space = current.get("hnsw:space", "l2")
+        if space != expected["hnsw:space"]:
+            reasons.append(f"'{space}' distance instead of '{expected['hnsw:space']}'")
+
+        id_scheme = current.get("id_scheme", 1)
+        if id_scheme != expected["id_scheme"]:
+            reasons.append(f"ID scheme v{id_scheme} instead of v{expected['id_scheme']}")
+
+        if "embedding_model" in expected:
+            model = current.get("embedding_model")
+            if model != expected["embedding_model"]:
+                reasons.append(f"embeddings from '{model}' instead of '{expected['embedding_model']}'")
+
+        return reasons
+
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        """L2-normalize embedding rows so cosine distance reduces to an inner product."""
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.clip(norms, 1e-12, None)
+
+    @staticmethod
+    def _id_to_key(doc_id: str) -> int:
+        """Convert a `doc_<hex digest>` ID to its 64-bit integer digest."""
+        return int(doc_id.removeprefix("doc_"), 16)
+
     @staticmethod
     def _generate_document_id(doc: Document) -> str:
         """
         Generate a deterministic document ID.
 
+        Metadata is serialized with sorted keys so the ID does not depend
+        on dict insertion order.
+
         Args:
             doc: Document object.
 
         Returns:
             Deterministic document identifier string.
         """
-        combined = f"{doc.page_content}{doc.metadata}"
-        digest = hashlib.sha256(combined.encode("utf-8")).hexdigest()
-        return f"doc_{digest[:16]}"
+        metadata = json.dumps(doc.metadata, sort_keys=True, default=str)
+        combined = f"{doc.page_content}{metadata}"
+        digest = hashlib.blake2b(
+            combined.encode("utf-8"), digest_size=8
+        ).hexdigest()
+        return f"doc_{digest}"
@@ -1,12 +1,14 @@
 # src/integrate_llm.py
 from __future__ import annotations
 
-from collections.abc import Iterator
+from collections.abc import AsyncIterator
 from typing import TypedDict
+import asyncio
 import os
 import subprocess
 import time
 
+import httpx
 import ollama
 from ollama._types import ResponseError
 
@@ -21,13 +23,18 @@ class OllamaChat:
     This class:
     - Ensures the Ollama container is running
     - Connects to the container endpoint
-    - Maintains conversation history
+    - Maintains a bounded conversation history (system message + last N turns)
     - Augments user queries with retrieved context
     - Supports both streaming and non-streaming responses
+    - Overlaps retrieval with prefill of the existing history (async chat)
     
     All configuration (container name, host, port, volume) is passed via constructor.
     """
 
+    # Endpoint -> time of the last successful liveness probe, shared across instances
+    _running_cache: dict[str, float] = {}
+    _RUNNING_CACHE_TTL: float = 5.0
+
     def __init__(
         self,
         model: str,
@@ -35,7 +42,10 @@ class OllamaChat:
         container_name: str,
         host: str = "http://localhost",
         port: int = 11434,
-        data_volume: str = "ollama_data"
+        data_volume: str = "ollama_data",
+        max_turns: int = 4,
+        num_ctx: int = 4096,
+        keep_alive: str = "30m"
     ) -> None:
         """
         Initialize the Ollama chat client.
@@ -47,6 +57,12 @@ class OllamaChat:
             host: Ollama API endpoint host (e.g., http://localhost)
             port: Port for Ollama API
             data_volume: Docker volume name for persistent model storage
+            max_turns: Maximum number of past user/assistant turns kept in the history.
+                       Once exceeded, the oldest turns are dropped in one block
+                       (down to max_turns // 2), so the prompt prefix stays stable
+                       between trims.
+            num_ctx: Fixed context window size, so the loaded model (and its KV cache) is reused
+            keep_alive: How long Ollama keeps the model loaded between calls
         """
         self.model = model
         self.retriever = retriever
@@ -54,6 +70,9 @@ class OllamaChat:
         self.port = port
         self.host = host
         self.data_volume = data_volume
+        self.max_turns = max_turns
+        self.keep_alive = keep_alive
+        self.options: dict[str, int] = {"num_ctx": num_ctx}
 
         # Set Ollama SDK host to container endpoint
         os.environ["OLLAMA_HOST"] = f"{self.host}:{self.port}"
@@ -61,6 +80,12 @@ class OllamaChat:
         # Start container if needed
         self._ensure_container_running()
 
+        # Async client used by chat(); created after OLLAMA_HOST is set
+        self._async_client = ollama.AsyncClient(host=f"{self.host}:{self.port}")
+
+        # True when the history prefix is not yet in Ollama's KV cache
+        self._prefix_dirty: bool = True
+
         # Ensure the model exists inside the container
         self._ensure_model(self.model)
 
@@ -81,8 +106,38 @@ class OllamaChat:
         )
         self.history.append({"role": "assistant", "content": self.welcome_message})
         
+    @property
+    def _endpoint(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def _is_server_up(self) -> bool:
+        """
+        Check whether the Ollama API answers, without shelling out to docker.
+
+        Successful probes are cached per endpoint for `_RUNNING_CACHE_TTL` seconds.
+        """
+        last_seen = OllamaChat._running_cache.get(self._endpoint)
+        if last_seen is not None and time.monotonic() - last_seen < self._RUNNING_CACHE_TTL:
+            return True
+
+        try:
+            response = httpx.get(f"{self._endpoint}/api/tags", timeout=0.2)
+        except (httpx.HTTPError, httpx.InvalidURL):
+            # InvalidURL (e.g. an unset port) is not an HTTPError subclass
+            return False
+
+        if response.status_code != 200:
+            return False
+
+        OllamaChat._running_cache[self._endpoint] = time.monotonic()
+        return True
+
     def _ensure_container_running(self) -> None:
         """Start Ollama Docker container if not already running, or start stopped container."""
+        if self._is_server_up():
+            print(f"Ollama server already running at {self._endpoint}.")
+            return
+
         try:
             # Check if a container with the given name exists
             result = subprocess.run(
@@ -134,6 +189,8 @@ class OllamaChat:
                 model=model_name,
                 messages=[{"role": "user", "content": "ping"}],
                 stream=False,
+                options=self.options,
+                keep_alive=self.keep_alive,
             )
         except ResponseError as exc:
             if exc.status_code == 404:
@@ -153,6 +210,8 @@ class OllamaChat:
             )
             container_id = result.stdout.strip()
 
+            OllamaChat._running_cache.pop(self._endpoint, None)
+
             if container_id:
                 print(f"Stopping Ollama container '{self.container_name}'...")
                 subprocess.run(["docker", "stop", self.container_name], check=True)
@@ -163,53 +222,133 @@ class OllamaChat:
         except Exception as e:
             print(f"[Warning] Failed to stop Ollama container: {e}")
 
-    def chat(
+    async def chat(
         self,
         question: str,
         k: int = 5,
         stream: bool = False,
-    ) -> str | Iterator[str]:
-        """Ask a question using RAG-enhanced context."""
-        docs: list[RetrievedDocument] = self.retriever.retrieve(
-            query=question,
-            top_k=k,
+    ) -> str | AsyncIterator[str]:
+        """
+        Ask a question using RAG-enhanced context.
+
+        Retrieval runs in a worker thread while Ollama prefills the history in
+        parallel, so only the new prompt is prefilled once the context is ready.
+        The history is re-prefilled after every turn, because Ollama last saw
+        the previous question with its RAG context, not the bare question
+        stored in the history.
+        """
+        retrieve_task = asyncio.create_task(
+            asyncio.to_thread(self.retriever.retrieve, question, k)
+        )
+        prewarm_task = (
+            asyncio.create_task(self._prewarm()) if self._prefix_dirty else None
         )
 
+        try:
+            docs: list[RetrievedDocument] = await retrieve_task
+            if prewarm_task is not None:
+                await prewarm_task
+        finally:
+            if prewarm_task is not None and not prewarm_task.done():
+                prewarm_task.cancel()
+
+        # Context only goes into the outgoing message; history keeps the bare question
         prompt: str = self._build_rag_prompt(question, docs)
-        self.history.append({"role": "user", "content": prompt})
+        messages: list[ChatMessage] = self.history + [{"role": "user", "content": prompt}]
 
         if stream:
-            return self._stream_response()
+            return self._stream_response(question, messages)
 
-        response = ollama.chat(
+        response = await self._async_client.chat(
             model=self.model,
-            messages=self.history,
+            messages=messages,
             stream=False,
+            options=self.options,
+            keep_alive=self.keep_alive,
         )
         answer: str = response["message"]["content"]
-        self.history.append({"role": "assistant", "content": answer})
+        self._record_turn(question, answer)
         return answer
 
-    def _stream_response(self) -> Iterator[str]:
+    async def _prewarm(self) -> None:
+        """
+        Prefill the current history so Ollama's KV cache holds the prompt prefix.
+
+        Generates a single token; failures are reported and otherwise ignored,
+        since the real request does not depend on it.
+        """
+        try:
+            await self._async_client.chat(
+                model=self.model,
+                messages=self.history,
+                stream=False,
+                options={**self.options, "num_predict": 1},
+                keep_alive=self.keep_alive,
+            )
+            self._prefix_dirty = False
+        except Exception as e:
+            print(f"[Warning] Failed to prewarm Ollama: {e}")
+
+    async def _stream_response(
+        self,
+        question: str,
+        messages: list[ChatMessage],
+    ) -> AsyncIterator[str]:
         """Stream the assistant response token-by-token."""
         response_text: str = ""
 
-        for chunk in ollama.chat(
+        async for chunk in await self._async_client.chat(
             model=self.model,
-            messages=self.history,
+            messages=messages,
             stream=True,
+            options=self.options,
+            keep_alive=self.keep_alive,
         ):
             partial: str = chunk["message"]["content"]
             response_text += partial
             yield partial
 
-        self.history.append({"role": "assistant", "content": response_text})
+        self._record_turn(question, response_text)
+
+    def _record_turn(self, question: str, answer: str) -> None:
+        """Append a finished turn (bare question, no context) and trim the history."""
+        self.history.append({"role": "user", "content": question})
+        self.history.append({"role": "assistant", "content": answer})
+        self._trim_history()
+        # Ollama's cached prefix ends with the RAG prompt, not the bare question
+        self._prefix_dirty = True
+
+    def _trim_history(self) -> bool:
+        """
+        Drop the oldest turns once the history exceeds `max_turns` turns.
+
+        Trimming in one block (down to max_turns // 2 turns) rather than one
+        turn per call keeps the older turns identical between trims, so the
+        per-turn prewarm only has to prefill the latest turn.
+
+        Returns:
+            True if the history was trimmed.
+        """
+        turns = self.history[1:]
+        if len(turns) <= 2 * self.max_turns:
+            return False
+
+        keep = 2 * (self.max_turns // 2)
+        self.history = self.history[:1] + turns[len(turns) - keep:]
+        return True
 
     def _build_rag_prompt(
         self,
         question: str,
         docs: list[RetrievedDocument],
     ) -> str:
-        """Construct a RAG prompt by injecting retrieved context."""
-        context: str = "\n\n".join(doc["document"] for doc in docs)
+        """
+        Construct a RAG prompt by injecting retrieved context.
+
+        The context block comes first, in a deterministic order (sorted by
+        document ID), and the question last, so overlapping retrievals yield a
+        common prompt prefix that Ollama's prefix cache can reuse.
+        """
+        ordered_docs = sorted(docs, key=lambda doc: doc["id"])
+        context: str = "\n\n".join(doc["document"] for doc in ordered_docs)
         return f"Context:\n{context}\n\nQuestion:\n{question}"
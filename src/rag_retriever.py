@@ -1,6 +1,9 @@
 # src/rag_retriever.py
 from __future__ import annotations
-from typing import List
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import numpy as np
 
 from src.data_embedding import EmbeddingManager
 from src.data_vector_store import VectorStore
@@ -13,20 +16,57 @@ class RAGRetriever:
     using embedding similarity.
     """
 
-    def __init__(self, vector_store: VectorStore, embedding_manager: EmbeddingManager) -> None:
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        embedding_manager: EmbeddingManager,
+        query_cache_size: int = 1024
+    ) -> None:
         """
         Args:
             vector_store: Instance of VectorStore for document search.
             embedding_manager: Instance of EmbeddingManager to generate query embeddings.
+            query_cache_size: Number of query embeddings kept in the LRU cache.
         """
         self.vector_store = vector_store
         self.embedding_manager = embedding_manager
 
+        # LRU cache of query embeddings so repeated queries skip the embedding model
+        self.query_cache_size = query_cache_size
+        self._query_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Embed queries, encoding all cache misses in a single model call.
+
+        Args:
+            queries: Non-empty query strings.
+
+        Returns:
+            Numpy array of shape (len(queries), embedding_dim).
+        """
+        misses = list(dict.fromkeys(q for q in queries if q not in self._query_cache))
+        if misses:
+            embeddings = self.embedding_manager.generate_embeddings(misses)
+            for query, embedding in zip(misses, embeddings):
+                self._query_cache[query] = embedding
+
+        rows = []
+        for query in queries:
+            self._query_cache.move_to_end(query)
+            rows.append(self._query_cache[query])
+
+        while len(self._query_cache) > self.query_cache_size:
+            self._query_cache.popitem(last=False)
+
+        return np.stack(rows)
+
     def retrieve(
         self,
         query: str,
         top_k: int = 5,
-        score_threshold: float = 0.0
+        score_threshold: float = 0.0,
+        mmr_lambda: Optional[float] = None
     ) -> List[RetrievedDocument]:
         """
         Retrieve top-k relevant documents for a query with similarity scores.
@@ -35,50 +75,161 @@ class RAGRetriever:
             query: Text query to search for.
             top_k: Maximum number of documents to retrieve.
             score_threshold: Minimum similarity score to include a document.
+            mmr_lambda: If set, over-fetch candidates and rerank them with
+                        Maximal Marginal Relevance (1.0 = pure relevance,
+                        0.0 = pure diversity).
 
         Returns:
             List of RetrievedDocument objects, sorted by rank.
         """
-        if not query.strip():
-            return []
+        return self.retrieve_batch([query], top_k, score_threshold, mmr_lambda)[0]
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        score_threshold: float = 0.0,
+        mmr_lambda: Optional[float] = None
+    ) -> List[List[RetrievedDocument]]:
+        """
+        Retrieve top-k relevant documents for several queries at once.
 
-        # Generate query embedding
-        query_embedding = self.embedding_manager.generate_embeddings([query])[0]
+        All queries are embedded in one model call and searched with one
+        Chroma query.
+
+        Args:
+            queries: Text queries to search for.
+            top_k: Maximum number of documents to retrieve per query.
+            score_threshold: Minimum similarity score to include a document.
+            mmr_lambda: If set, fetch 3 * top_k candidates per query and
+                        rerank them with Maximal Marginal Relevance.
+
+        Returns:
+            One list of RetrievedDocument objects per query, sorted by rank.
+            Blank queries get an empty list.
+        """
+        retrieved: List[List[RetrievedDocument]] = [[] for _ in queries]
+
+        positions = [i for i, query in enumerate(queries) if query.strip()]
+        if not positions:
+            return retrieved
+
+        # Generate query embeddings (cached)
+        query_embeddings = self._embed_queries([queries[i] for i in positions])
+
+        use_mmr = mmr_lambda is not None
+        include = ["documents", "metadatas", "distances"]
+        if use_mmr:
+            include.append("embeddings")
 
         try:
             results = self.vector_store.collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k
+                query_embeddings=np.ascontiguousarray(query_embeddings, dtype=np.float32),
+                n_results=3 * top_k if use_mmr else top_k,
+                include=include
             )
 
-            retrieved_docs: List[RetrievedDocument] = []
-
-            if not results['documents'] or not results['documents'][0]:
-                return []
-
-            documents = results['documents'][0]
-            metadatas = results['metadatas'][0]
-            distances = results['distances'][0]
-            ids = results['ids'][0]
-
-            for i, (doc_id, document, metadata, distance) in enumerate(
-                zip(ids, documents, metadatas, distances)
-            ):
-                similarity_score = 1.0 - distance
-                if similarity_score >= score_threshold:
-                    retrieved_docs.append(
-                        RetrievedDocument(
-                            id=doc_id,
-                            metadata=metadata,
-                            document=document,
-                            similarity_score=similarity_score,
-                            distance=distance,
-                            rank=i + 1
-                        )
+            if not results['documents']:
+                return retrieved
+
+            for row, position in enumerate(positions):
+                order = None
+                if use_mmr and len(results['documents'][row]):
+                    order = self._mmr_select(
+                        query_embeddings[row],
+                        np.asarray(results['embeddings'][row], dtype=np.float32),
+                        top_k,
+                        mmr_lambda
                     )
+                retrieved[position] = self._build_results(
+                    results['ids'][row],
+                    results['documents'][row],
+                    results['metadatas'][row],
+                    results['distances'][row],
+                    score_threshold,
+                    order
+                )
 
-            return retrieved_docs
+            return retrieved
 
         except Exception as e:
             print(f"Error during retrieval: {e}")
+            return [[] for _ in queries]
+
+    @staticmethod
+    def _mmr_select(
+        query_embedding: np.ndarray,
+        doc_embeddings: np.ndarray,
+        top_k: int,
+        mmr_lambda: float
+    ) -> List[int]:
+        """
+        Select up to top_k candidates with Maximal Marginal Relevance.
+
+        Each step picks the candidate maximizing
+        mmr_lambda * sim(query, doc) - (1 - mmr_lambda) * max sim(doc, selected),
+        using one matrix-vector product per selected document.
+
+        Args:
+            query_embedding: Query embedding of shape (embedding_dim,).
+            doc_embeddings: Candidate embeddings of shape (n_candidates, embedding_dim).
+            top_k: Number of candidates to select.
+            mmr_lambda: Trade-off between relevance (1.0) and diversity (0.0).
+
+        Returns:
+            Indices into doc_embeddings, in selection order.
+        """
+        relevance = doc_embeddings @ query_embedding.astype(np.float32)
+        redundancy = np.full(len(doc_embeddings), -np.inf, dtype=np.float32)
+        scores = relevance.copy()
+
+        selected: List[int] = []
+        for _ in range(min(top_k, len(doc_embeddings))):
+            i = int(np.argmax(scores))
+            selected.append(i)
+            np.maximum(redundancy, doc_embeddings @ doc_embeddings[i], out=redundancy)
+            scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * redundancy
+            scores[selected] = -np.inf
+
+        return selected
+
+    @staticmethod
+    def _build_results(
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[dict[str, Any]],
+        distances: List[float],
+        score_threshold: float,
+        order: Optional[List[int]] = None
+    ) -> List[RetrievedDocument]:
+        """
+        Convert one query's Chroma results into RetrievedDocument objects.
+
+        Args:
+            order: Indices of the results to return, in rank order.
+                   Defaults to Chroma's order.
+        """
+        if not documents:
             return []
+
+        # Cosine distance on normalized embeddings: exact cosine similarity
+        order_array = np.arange(len(documents)) if order is None else np.asarray(order, dtype=np.int64)
+        distance_array = np.asarray(distances, dtype=np.float64)[order_array]
+        scores = 1.0 - distance_array
+        keep = np.flatnonzero(scores >= score_threshold).tolist()
+        kept_indices = order_array[keep].tolist()
+        kept_scores = scores[keep].tolist()
+        kept_distances = distance_array[keep].tolist()
+
+        rd = RetrievedDocument
+        return [
+            rd(
+                id=ids[i],
+                metadata=metadatas[i],
+                document=documents[i],
+                similarity_score=score,
+                distance=distance,
+                rank=position + 1
+            )
+            for position, i, score, distance in zip(keep, kept_indices, kept_scores, kept_distances)
+        ]